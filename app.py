@@ -1,16 +1,50 @@
 import streamlit as st
 from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
+import requests
 import gspread
+from gspread.utils import rowcol_to_a1
 from datetime import datetime
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.http import HttpRequest, MediaIoBaseUpload
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 import io
+import logging
+import numpy as np
 import pandas as pd
+from pandas.api.types import CategoricalDtype
+from PIL import Image
+
+logger = logging.getLogger(__name__)
 
 # CONFIG
 SHEET_NAME = "Hybb Utility System"
 WORKSHEET_NAME = "Requests"
 SHARED_DRIVE_FOLDER_ID = "0AO88IQGAqsTKUk9PVA"  # Your folder ID inside shared drive
+KITCHENS = ["WFD01", "BSN01", "HSR01", "MAR01", "SKM01"]
+STATUSES = ["Pending", "Approved", "Rejected"]
+THUMBNAIL_COLUMN = "Thumbnail URL"
+THUMBNAIL_COLUMN_INDEX = 9  # Column I: the 9th value written on submit
+DERIVED_COLUMNS = ["Timestamp_display", "Month", "Date", "_name_lc", "_id_lc"]  # Added by build_dataframe()
+ADMIN_COLUMNS = ["Timestamp_display", "Kitchen", "Employee Name", "Employee ID", "Photo URL",
+                 "Status", "Action_By", "Comments", THUMBNAIL_COLUMN]
+THUMBNAIL_WIDTH = 400  # Width (px) Drive renders admin previews at
+IMAGE_MAX_SIDE = 1280  # Longest side (px) of uploaded photos
+IMAGE_JPEG_QUALITY = 80
+SHEET_REVISION_TTL = 5  # Seconds between Drive modifiedTime probes
+SHEET_REVISION_TIMEOUT = 5  # Seconds before giving up on the probe
+SHEET_DATA_TTL = 300  # Safety net; data caches are keyed by sheet revision
+ADMIN_PAGE_SIZE = 20  # Requests rendered per admin page
+DATA_RANGE = "A:I"  # Timestamp .. Thumbnail URL, matching the row layout written on submit
+# Status is the 6th value written on submit; load_pending_dataframe() checks the header agrees
+STATUS_COLUMN = 6
+MAX_PENDING_RANGES = 50  # Beyond this many row ranges the batchGet URL gets too long; read the full sheet
+# Typed values keep the payload small; timestamps stay as the strings we wrote
+VALUE_RENDER_OPTIONS = {
+    "value_render_option": "UNFORMATTED_VALUE",
+    "date_time_render_option": "FORMATTED_STRING",
+}
 
 # ===== GOOGLE SHEET & DRIVE SETUP =====
 def get_credentials():
@@ -22,20 +56,44 @@ def get_credentials():
         ]
     )
 
+@st.cache_resource(show_spinner=False)
 def connect_to_sheet():
     creds = get_credentials()
     client = gspread.authorize(creds)
     sheet = client.open(SHEET_NAME).worksheet(WORKSHEET_NAME)
     return sheet, creds
 
+@st.cache_resource(show_spinner=False)
+def get_drive_service(_creds):
+    """Builds the Drive client once per process from the bundled discovery document.
+
+    httplib2 is not thread-safe, so only the service is shared: every request gets its own
+    authorized HTTP object.
+    """
+    def build_request(http, *args, **kwargs):
+        return HttpRequest(AuthorizedHttp(_creds, http=httplib2.Http()), *args, **kwargs)
+
+    return build('drive', 'v3', http=AuthorizedHttp(_creds, http=httplib2.Http()),
+                 requestBuilder=build_request, cache_discovery=False, static_discovery=True)
+
+def compress_image(image_data):
+    """Downscales a photo and re-encodes it as JPEG, returning an in-memory buffer."""
+    img = Image.open(io.BytesIO(image_data))
+    img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    buf.seek(0)
+    return buf
+
 def save_image_to_drive(image_data, creds):
-    """Uploads image bytes to Google Drive folder & returns a direct link."""
-    service = build('drive', 'v3', credentials=creds)
+    """Uploads image bytes to Google Drive folder & returns (direct link, thumbnail link)."""
+    service = get_drive_service(creds)
     file_metadata = {
         'name': f"image_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg",
         'parents': [SHARED_DRIVE_FOLDER_ID],
     }
-    media = MediaIoBaseUpload(io.BytesIO(image_data), mimetype='image/jpeg')
+    # Photos are small after compression, so a single multipart upload beats a resumable session
+    media = MediaIoBaseUpload(compress_image(image_data), mimetype='image/jpeg', resumable=False)
     file = service.files().create(
         body=file_metadata,
         media_body=media,
@@ -43,7 +101,170 @@ def save_image_to_drive(image_data, creds):
         supportsAllDrives=True
     ).execute()
     file_id = file.get("id")
-    return f"https://drive.google.com/uc?id={file_id}"
+    return (
+        f"https://drive.google.com/uc?id={file_id}",
+        f"https://drive.google.com/thumbnail?id={file_id}&sz=w{THUMBNAIL_WIDTH}",
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_drive_session(_creds):
+    """Pooled, thread-safe HTTP session for the Drive revision probe, kept open across reruns."""
+    return AuthorizedSession(_creds)
+
+@st.cache_data(ttl=SHEET_REVISION_TTL, show_spinner=False)
+def get_sheet_revision(_sheet, _creds):
+    """Returns the spreadsheet's Drive modifiedTime, a cheap probe for whether the data changed.
+
+    The probe is optional: if Drive fails, returns None and the data caches fall back to SHEET_DATA_TTL.
+    """
+    try:
+        response = get_drive_session(_creds).get(
+            f"https://www.googleapis.com/drive/v3/files/{_sheet.spreadsheet.id}",
+            params={"fields": "modifiedTime", "supportsAllDrives": "true"},
+            timeout=SHEET_REVISION_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()["modifiedTime"]
+    except requests.RequestException as e:
+        logger.warning("Sheet revision probe failed, using TTL-based caching: %s", e)
+        return None
+
+@st.cache_data(ttl=SHEET_DATA_TTL, show_spinner=False)
+def load_sheet_values(_sheet, revision):
+    """Fetches the request columns, re-downloading only when the sheet revision changes."""
+    return _sheet.get_values(DATA_RANGE, **VALUE_RENDER_OPTIONS)
+
+def as_category(series, known):
+    """Converts a column to categorical, keeping any values outside the known set."""
+    extra = sorted(set(series.unique()) - set(known))
+    return series.astype(CategoricalDtype(categories=known + extra))
+
+def build_dataframe(header, rows, index=None):
+    """Builds a typed requests DataFrame with parsed Timestamp, display, Month and Date columns."""
+    df = pd.DataFrame(rows, columns=header, index=index)
+    raw_timestamps = df["Timestamp"]
+    df["Timestamp"] = pd.to_datetime(raw_timestamps, format="%Y-%m-%d %H:%M:%S", errors="coerce", cache=True)
+    # Unparseable timestamps are shown as written in the sheet
+    df["Timestamp_display"] = df["Timestamp"].dt.strftime("%d %b %Y, %I:%M %p").fillna(raw_timestamps.astype(str))
+    # "YYYY-MM" periods are computed arithmetically and sort chronologically in the chart
+    df["Month"] = df["Timestamp"].dt.to_period("M").astype(str).where(df["Timestamp"].notna())
+    df["Date"] = df["Timestamp"].dt.date
+    # Unformatted reads return numbers for numeric-looking cells; keep text columns as text
+    for col in ("Employee Name", "Employee ID", "Comments"):
+        df[col] = df[col].astype(str)
+    # Lowercased copies so the admin search is a plain case-sensitive substring scan
+    df["_name_lc"] = df["Employee Name"].str.lower()
+    df["_id_lc"] = df["Employee ID"].str.lower()
+    df["Kitchen"] = as_category(df["Kitchen"], KITCHENS)
+    df["Status"] = as_category(df["Status"], STATUSES)
+    return df
+
+@st.cache_data(ttl=SHEET_DATA_TTL, show_spinner=False)
+def load_dataframe(_sheet, revision):
+    """Builds the requests DataFrame once per sheet revision."""
+    data = load_sheet_values(_sheet, revision)
+    if len(data) < 2:
+        return pd.DataFrame()
+    return build_dataframe(data[0], data[1:])
+
+@st.cache_data(ttl=SHEET_DATA_TTL, show_spinner=False)
+def load_monthly_summary(_sheet, revision):
+    """Month-wise request counts per kitchen: (summary table, Month x Kitchen matrix for the chart)."""
+    df = load_dataframe(_sheet, revision)
+    counts = df.groupby(["Kitchen", "Month"], observed=True).size()
+    return counts.reset_index(name="Tanker Purchased"), counts.unstack("Kitchen", fill_value=0)
+
+def _contiguous_runs(numbers):
+    """Yields (first, last) for each run of consecutive integers in a sorted list."""
+    start = prev = numbers[0]
+    for n in numbers[1:]:
+        if n != prev + 1:
+            yield start, prev
+            start = n
+        prev = n
+    yield start, prev
+
+def _pending_from_full_read(sheet, revision):
+    """Pending rows filtered out of the full cached sheet read."""
+    df = load_dataframe(sheet, revision)
+    if df.empty:
+        return df
+    return df[df["Status"] == "Pending"]
+
+@st.cache_data(ttl=SHEET_DATA_TTL, show_spinner=False)
+def load_pending_dataframe(_sheet, revision):
+    """Reads only the header, the Status column and the Pending rows instead of the whole sheet.
+
+    Falls back to filtering the full read if the header doesn't have Status where rows are
+    written, or if the Pending rows are too scattered to fetch in one request.
+
+    The index holds each row's position in the full sheet (sheet row - 2), like load_dataframe().
+    """
+    status_col = rowcol_to_a1(1, STATUS_COLUMN)[:-1]
+    header, statuses = _sheet.batch_get(["1:1", f"{status_col}:{status_col}"])
+    header = header[0] if header else []
+    if len(header) < STATUS_COLUMN or header[STATUS_COLUMN - 1] != "Status":
+        return _pending_from_full_read(_sheet, revision)
+    row_numbers = [n for n, cell in enumerate(statuses[1:], start=2) if cell and cell[0] == "Pending"]
+    if not row_numbers:
+        return pd.DataFrame(columns=header)
+
+    last_col = len(header)
+    ranges = [f"{rowcol_to_a1(first, 1)}:{rowcol_to_a1(last, last_col)}"
+              for first, last in _contiguous_runs(row_numbers)]
+    if len(ranges) > MAX_PENDING_RANGES:
+        # Pending rows are scattered; one full read is cheaper than an oversized request
+        return _pending_from_full_read(_sheet, revision)
+    rows = []
+    for value_range in _sheet.batch_get(ranges, **VALUE_RENDER_OPTIONS):
+        # Sheets trims trailing empty cells, so pad back out to the header width
+        rows.extend(row + [""] * (last_col - len(row)) for row in value_range)
+    return build_dataframe(header, rows, index=[n - 2 for n in row_numbers])
+
+def clear_sheet_cache():
+    """Drops cached sheet data so the next rerun sees our writes."""
+    get_sheet_revision.clear()
+    load_sheet_values.clear()
+    load_dataframe.clear()
+    load_pending_dataframe.clear()
+    load_monthly_summary.clear()
+
+def update_request_cells(sheet, row, updates):
+    """Writes {column: value} cells of one sheet row in a single batch_update call.
+
+    Values are USER_ENTERED, as update_cell() wrote them.
+    """
+    sheet.batch_update([
+        {"range": rowcol_to_a1(row, col), "values": [[value]]}
+        for col, value in updates.items()
+    ], value_input_option="USER_ENTERED")
+
+def append_request_row(sheet, row):
+    """Writes one new request row straight to the sheet (RAW, as append_row did)."""
+    sheet.append_rows([row], value_input_option="RAW")
+    clear_sheet_cache()
+
+@st.cache_resource(show_spinner=False)
+def thumbnail_column_ready(_sheet):
+    """Makes sure column I, where submit writes the thumbnail, is headed "Thumbnail URL".
+
+    Adds the header on first use if the sheet predates it. Returns False, and thumbnails are
+    skipped, if I1 already holds something else. Checked once per process.
+    """
+    header = _sheet.row_values(1)
+    existing = header[THUMBNAIL_COLUMN_INDEX - 1] if len(header) >= THUMBNAIL_COLUMN_INDEX else ""
+    if existing == THUMBNAIL_COLUMN:
+        return True
+    cell = rowcol_to_a1(1, THUMBNAIL_COLUMN_INDEX)
+    if existing:
+        logger.warning("%s!%s is '%s', not '%s'; thumbnails are disabled",
+                       WORKSHEET_NAME, cell, existing, THUMBNAIL_COLUMN)
+        return False
+    if _sheet.col_count < THUMBNAIL_COLUMN_INDEX:
+        _sheet.add_cols(THUMBNAIL_COLUMN_INDEX - _sheet.col_count)
+    _sheet.update_cell(1, THUMBNAIL_COLUMN_INDEX, THUMBNAIL_COLUMN)
+    logger.info("Added '%s' header to %s!%s", THUMBNAIL_COLUMN, WORKSHEET_NAME, cell)
+    return True
 
 # ===== ADMIN LOGIN =====
 def is_admin():
@@ -55,10 +276,6 @@ def is_admin():
 
 # ===== MAIN APP =====
 def main():
-    st.markdown("""
-        <style>.stApp { background-color: #e0f7e9; }</style>
-    """, unsafe_allow_html=True)
-
     st.title("📋 HYBB Utility App")
 
     # Connect to Google Sheet
@@ -73,7 +290,7 @@ def main():
     # ===== SUBMIT REQUEST =====
     if menu == "Submit Request":
         st.subheader("📸 Submit Request")
-        kitchen = st.selectbox("Select Kitchen", ["--Select--", "WFD01", "BSN01", "HSR01", "MAR01", "SKM01"])
+        kitchen = st.selectbox("Select Kitchen", ["--Select--"] + KITCHENS)
         emp_name = st.text_input("Employee Name")
         emp_id = st.text_input("Employee ID")
         picture = st.camera_input("Take Photo (camera only)")
@@ -82,34 +299,37 @@ def main():
             if kitchen == "--Select--" or not emp_name or not emp_id or not picture:
                 st.warning("⚠️ Please fill all fields and take a photo.")
             else:
-                img_url = save_image_to_drive(picture.getvalue(), creds)
-                sheet.append_row([
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    kitchen, emp_name, emp_id, img_url,
-                    "Pending", "", ""
-                ])
+                submitted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                with st.spinner("Submitting request..."):
+                    img_url, thumb_url = save_image_to_drive(picture.getvalue(), creds)
+                    row = [
+                        submitted_at,
+                        kitchen, emp_name, emp_id, img_url,
+                        "Pending", "", ""
+                    ]
+                    try:
+                        if thumbnail_column_ready(sheet):
+                            row.append(thumb_url)
+                    except gspread.exceptions.APIError as e:
+                        logger.warning("Could not check the thumbnail column; skipping thumbnail: %s", e)
+                    append_request_row(sheet, row)
                 st.success("✅ Request submitted successfully!")
 
     # ===== DASHBOARD =====
     elif menu == "Dashboard":
         dashboard_option = st.radio("Select View", ["Tanker Purchase Summary", "Ticket Status"])
 
-        data = sheet.get_all_values()
-        if len(data) < 2:
+        revision = get_sheet_revision(sheet, creds)
+        df = load_dataframe(sheet, revision)
+        if df.empty:
             st.info("No data available yet.")
             return
 
-        df = pd.DataFrame(data[1:], columns=data[0])
-        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
-
         if dashboard_option == "Tanker Purchase Summary":
             st.subheader("🚰 Tanker Purchase Summary (Month-wise)")
-            df["Month"] = df["Timestamp"].dt.strftime("%b %Y")
-            tanker_summary = df.groupby(["Kitchen", "Month"]).size().reset_index(name="Tanker Purchased")
+            tanker_summary, monthly_pivot = load_monthly_summary(sheet, revision)
             st.dataframe(tanker_summary)
-            st.bar_chart(
-                tanker_summary.pivot(index="Month", columns="Kitchen", values="Tanker Purchased").fillna(0)
-            )
+            st.bar_chart(monthly_pivot)
 
         elif dashboard_option == "Ticket Status":
             st.subheader("🎫 Ticket Status")
@@ -120,9 +340,9 @@ def main():
             if kitchen_filter != "All":
                 filtered_df = filtered_df[filtered_df["Kitchen"] == kitchen_filter]
             if date_filter:
-                filtered_df = filtered_df[filtered_df["Timestamp"].dt.date == date_filter]
+                filtered_df = filtered_df[filtered_df["Date"] == date_filter]
 
-            st.dataframe(filtered_df)
+            st.dataframe(filtered_df.drop(columns=DERIVED_COLUMNS))
 
     # ===== ADMIN DASHBOARD =====
     elif menu == "Admin Dashboard":
@@ -135,52 +355,70 @@ def main():
             return
 
         admin_menu = st.sidebar.radio("Admin Panel", ["Pending Requests", "All Requests"])
-        data = sheet.get_all_values()
-        if len(data) < 2:
+        if admin_menu == "Pending Requests":
+            df = load_pending_dataframe(sheet, get_sheet_revision(sheet, creds))
+        else:
+            df = load_dataframe(sheet, get_sheet_revision(sheet, creds))
+        if df.empty:
             st.info("No requests found.")
             return
 
-        df = pd.DataFrame(data[1:], columns=data[0])
-
         if admin_menu == "Pending Requests":
-            filtered_df = df[df["Status"] == "Pending"]
             st.subheader("🕒 Pending Requests")
         else:
-            filtered_df = df.copy()
             st.subheader("📋 All Requests")
 
-        kitchen_filter = st.selectbox("Filter by Kitchen", options=["All"] + sorted(filtered_df["Kitchen"].unique().tolist()))
-        status_filter = st.selectbox("Filter by Status", options=["All"] + sorted(filtered_df["Status"].unique().tolist()))
-        search_text = st.text_input("Search by Employee Name or ID")
+        # Filters only take effect on Apply, so typing a search doesn't rerun the page per keystroke
+        with st.form("admin_filters"):
+            kitchen_filter = st.selectbox("Filter by Kitchen", options=["All"] + sorted(df["Kitchen"].unique().tolist()))
+            status_filter = st.selectbox("Filter by Status", options=["All"] + sorted(df["Status"].unique().tolist()))
+            search_text = st.text_input("Search by Employee Name or ID")
+            if st.form_submit_button("Apply"):
+                st.session_state.page = 0
 
+        # Combine every filter into one mask so the frame is sliced only once
+        mask = np.ones(len(df), dtype=bool)
         if kitchen_filter != "All":
-            filtered_df = filtered_df[filtered_df["Kitchen"] == kitchen_filter]
+            mask &= (df["Kitchen"] == kitchen_filter).values
         if status_filter != "All":
-            filtered_df = filtered_df[filtered_df["Status"] == status_filter]
-        if search_text.strip():
-            filtered_df = filtered_df[
-                filtered_df["Employee Name"].str.contains(search_text, case=False, na=False) |
-                filtered_df["Employee ID"].str.contains(search_text, case=False, na=False)
-            ]
+            mask &= (df["Status"] == status_filter).values
+        query = search_text.strip().lower()
+        if query:
+            mask &= (
+                df["_name_lc"].str.contains(query, regex=False, na=False).values |
+                df["_id_lc"].str.contains(query, regex=False, na=False).values
+            )
+        filtered_df = df[mask]
 
         if filtered_df.empty:
             st.info("No matching requests found.")
             return
 
+        # Render one page at a time so widget count stays bounded
+        page_count = (len(filtered_df) - 1) // ADMIN_PAGE_SIZE + 1
+        page = min(st.session_state.setdefault("page", 0), page_count - 1)
+        st.session_state.page = page
+        page_df = filtered_df.iloc[page * ADMIN_PAGE_SIZE:(page + 1) * ADMIN_PAGE_SIZE]
+
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            st.button("⬅️ Prev", disabled=page == 0,
+                      on_click=lambda: st.session_state.update(page=page - 1))
+        with info_col:
+            st.write(f"Page {page + 1} of {page_count}  ({len(filtered_df)} requests)")
+        with next_col:
+            st.button("Next ➡️", disabled=page >= page_count - 1,
+                      on_click=lambda: st.session_state.update(page=page + 1))
+
         # Loop through requests
-        for i, row in filtered_df.iterrows():
+        rows = page_df.reindex(columns=ADMIN_COLUMNS, fill_value="").itertuples(index=True, name=None)
+        for i, request_time_str, kitchen, emp_name, emp_id, photo_url, status, action_by, comments, thumb_url in rows:
             st.markdown("---")
-            try:
-                request_time = datetime.strptime(row["Timestamp"], "%Y-%m-%d %H:%M:%S")
-                request_time_str = request_time.strftime("%d %b %Y, %I:%M %p")
-            except Exception:
-                request_time_str = row["Timestamp"]
-
             st.write(f"**Request Time:** {request_time_str}")
-            st.write(f"**Kitchen:** {row['Kitchen']}  |  **Employee:** {row['Employee Name']} ({row['Employee ID']})  |  **Status:** {row['Status']}")
+            st.write(f"**Kitchen:** {kitchen}  |  **Employee:** {emp_name} ({emp_id})  |  **Status:** {status}")
 
             st.markdown(f"""
-                <a href="{row['Photo URL']}" target="_blank" style="
+                <a href="{photo_url}" target="_blank" style="
                     display: inline-block; 
                     background-color: #4CAF50; 
                     color: white; 
@@ -193,25 +431,33 @@ def main():
             """, unsafe_allow_html=True)
 
             try:
-                st.image(row["Photo URL"], width=200)
+                # Older rows have no thumbnail; fall back to the full-size photo
+                st.image(thumb_url or photo_url, width=200)
             except:
                 st.write("⚠️ Image preview failed.")
 
             col1, col2, col3 = st.columns([1,1,4])
             with col1:
                 if st.button(f"Approve {i}", key=f"approve_{i}"):
-                    sheet.update_cell(i + 2, df.columns.get_loc("Status") + 1, "Approved")
-                    sheet.update_cell(i + 2, df.columns.get_loc("Action_By") + 1, admin_name)
+                    update_request_cells(sheet, i + 2, {
+                        df.columns.get_loc("Status") + 1: "Approved",
+                        df.columns.get_loc("Action_By") + 1: admin_name,
+                    })
+                    clear_sheet_cache()
                     st.success(f"Request {i+1} Approved")
             with col2:
                 if st.button(f"Reject {i}", key=f"reject_{i}"):
-                    sheet.update_cell(i + 2, df.columns.get_loc("Status") + 1, "Rejected")
-                    sheet.update_cell(i + 2, df.columns.get_loc("Action_By") + 1, admin_name)
+                    update_request_cells(sheet, i + 2, {
+                        df.columns.get_loc("Status") + 1: "Rejected",
+                        df.columns.get_loc("Action_By") + 1: admin_name,
+                    })
+                    clear_sheet_cache()
                     st.success(f"Request {i+1} Rejected")
             with col3:
-                comment = st.text_area(f"Add Comment (optional) for request {i+1}", value=row["Comments"], key=f"comment_{i}")
+                comment = st.text_area(f"Add Comment (optional) for request {i+1}", value=comments, key=f"comment_{i}")
                 if st.button(f"Save Comment {i}", key=f"save_comment_{i}"):
-                    sheet.update_cell(i + 2, df.columns.get_loc("Comments") + 1, comment)
+                    update_request_cells(sheet, i + 2, {df.columns.get_loc("Comments") + 1: comment})
+                    clear_sheet_cache()
                     st.success("Comment saved.")
 
 if __name__ == "__main__":